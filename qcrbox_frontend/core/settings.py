@@ -229,3 +229,10 @@ MAX_LENGTH_API_LOG = int(os.environ.get('MAX_LENGTH_API_LOG', 10000))
 # The time (in seconds) between automatic page refreshes when waiting for a
 # calculation to finish
 AUTO_REFRESH_TIME = 10
+
+# The time (in seconds) for which rendered dataset history trees are cached
+TREE_PLOT_CACHE_TIME = 3600
+
+# The minimum time (in seconds) between syncs of the applications list with
+# the QCrBox backend
+APP_SYNC_CACHE_TIME = 60
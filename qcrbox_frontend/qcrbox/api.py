@@ -10,6 +10,8 @@ successful.
 '''
 
 import logging
+import threading
+from functools import lru_cache
 
 from qcrboxapiclient.api.applications import (
     list_applications,
@@ -47,6 +49,9 @@ from qcrbox import models
 
 LOGGER = logging.getLogger(__name__)
 
+# Guards creation of the API client shared between threads
+CLIENT_LOCK = threading.Lock()
+
 # Set the string length above which non-error API responses will be truncated in the logs
 MAX_LENGTH_API_LOG = settings.MAX_LENGTH_API_LOG
 
@@ -85,15 +90,25 @@ class Response():
             self.is_valid = False
 
         else:
-            # Truncate the API response to sent to the logger if its a success
-            logtext = str(self.body)
+            self.is_valid = True
+
+            # Skip building the log text entirely if info logs are disabled
+            if not LOGGER.isEnabledFor(logging.INFO):
+                return
+
+            # Truncate the API response to sent to the logger if its a success;
+            # only summarise raw file contents (e.g. downloads) rather than
+            # building a full text copy of them just to truncate it
+            if isinstance(self.body, (bytes, bytearray)):
+                logtext = f'<{len(self.body)} bytes>'
+            else:
+                logtext = str(self.body)
             if len(logtext) > MAX_LENGTH_API_LOG:
                 logtext = logtext[:MAX_LENGTH_API_LOG-2]+' ... '+logtext[-2:]
             LOGGER.info(
                 'Response from API: %s',
                 logtext,
             )
-            self.is_valid = True
 
 
 # ==========================================
@@ -102,11 +117,33 @@ class Response():
 
 def get_client():
     '''A function to return an API client object pointing to the API base URL
-    set in settings.py
+    set in settings.py.  A single client is shared between calls, so that
+    consecutive API calls can reuse its open (keep-alive) connections rather
+    than each paying for a new connection to the backend.
+
+    The client is shared by all threads of a process (uwsgi runs several per
+    process, and kill_sessions makes calls from a thread pool).  It is built
+    under CLIENT_LOCK, so concurrent first calls cannot each build one.
+    Sharing it is thread-safe: the generated Client only holds its
+    configuration and an httpx.Client, whose connection pool is thread-safe.
+
+    '''
+
+    with CLIENT_LOCK:
+        return build_client()
+
+@lru_cache(maxsize=1)
+def build_client():
+    '''Build the shared API client.  Only call this through get_client().
 
     '''
 
     client = Client(base_url=settings.API_BASE_URL)
+
+    # The generated client creates its httpx client lazily on first use,
+    # which is not itself locked, so create it now while holding the lock
+    client.get_httpx_client()
+
     return client
 
 
@@ -131,7 +131,8 @@ class SelectCommandForm(forms.Form):
         super().__init__(*args, **kwargs)
 
         qset = models.AppCommand.objects.order_by('app__name','name')   # pylint: disable=no-member
-        choices = [(c.pk, ut.sanitize_command_name(c)) for c in qset.filter(app__active=True)]
+        qset = qset.filter(app__active=True).select_related('app')
+        choices = [(c.pk, ut.sanitize_command_name(c)) for c in qset]
 
         self.fields['command'].choices = choices
 
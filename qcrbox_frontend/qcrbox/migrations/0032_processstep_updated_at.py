@@ -0,0 +1,24 @@
+# pylint: skip-file
+
+# Generated by Django 5.2.7 on 2026-10-16 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("qcrbox", "0031_alter_appcommand_description_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="processstep",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
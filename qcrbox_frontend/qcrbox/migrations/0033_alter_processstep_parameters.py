@@ -0,0 +1,47 @@
+# pylint: skip-file
+
+# Generated by Django 5.2.7 on 2026-10-16 09:40
+
+import ast
+import json
+
+from django.db import migrations, models
+
+
+def parameters_to_json(apps, schema_editor):
+    '''Rewrite the stored Python-literal parameter strings as JSON text so
+    that the column can be converted to a JSONField.'''
+
+    ProcessStep = apps.get_model("qcrbox", "ProcessStep")
+    for step in ProcessStep.objects.all():
+        try:
+            params = ast.literal_eval(step.parameters)
+        except (ValueError, SyntaxError):
+            params = {}
+        step.parameters = json.dumps(params)
+        step.save(update_fields=["parameters"])
+
+
+def parameters_to_literal(apps, schema_editor):
+    '''Reverse of parameters_to_json.'''
+
+    ProcessStep = apps.get_model("qcrbox", "ProcessStep")
+    for step in ProcessStep.objects.all():
+        step.parameters = str(json.loads(step.parameters))
+        step.save(update_fields=["parameters"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("qcrbox", "0032_processstep_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(parameters_to_json, parameters_to_literal),
+        migrations.AlterField(
+            model_name="processstep",
+            name="parameters",
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# pylint: skip-file
+
+# Generated by Django 5.2.7 on 2026-10-16 10:05
+
+from django.db import migrations, models
+
+
+def populate_display_names(apps, schema_editor):
+    '''Copy the display filenames of existing ProcessSteps' infiles and
+    outfiles onto the ProcessSteps themselves.'''
+
+    ProcessStep = apps.get_model("qcrbox", "ProcessStep")
+    for step in ProcessStep.objects.select_related("infile", "outfile"):
+        step.infile_display_name = step.infile.display_filename if step.infile else ""
+        step.outfile_display_name = step.outfile.display_filename if step.outfile else ""
+        step.save(update_fields=["infile_display_name", "outfile_display_name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("qcrbox", "0033_alter_processstep_parameters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="processstep",
+            name="infile_display_name",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="processstep",
+            name="outfile_display_name",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.RunPython(populate_display_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# pylint: skip-file
+
+# Generated by Django 5.2.7 on 2026-10-16 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("qcrbox", "0034_processstep_infile_display_name_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="filemetadata",
+            name="filename",
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
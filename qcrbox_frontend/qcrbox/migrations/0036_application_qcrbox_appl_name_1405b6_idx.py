@@ -0,0 +1,21 @@
+# pylint: skip-file
+
+# Generated by Django 5.2.7 on 2026-10-16 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("qcrbox", "0035_alter_filemetadata_filename"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="application",
+            index=models.Index(
+                fields=["name", "version"], name="qcrbox_appl_name_1405b6_idx"
+            ),
+        ),
+    ]
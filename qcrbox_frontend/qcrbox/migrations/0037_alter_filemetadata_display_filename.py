@@ -0,0 +1,20 @@
+# pylint: skip-file
+
+# Generated by Django 5.2.7 on 2026-10-16 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("qcrbox", "0036_application_qcrbox_appl_name_1405b6_idx"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="filemetadata",
+            name="display_filename",
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
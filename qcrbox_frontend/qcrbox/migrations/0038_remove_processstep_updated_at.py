@@ -0,0 +1,19 @@
+# pylint: skip-file
+
+# Generated by Django 5.2.7 on 2026-10-16 15:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("qcrbox", "0037_alter_filemetadata_display_filename"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="processstep",
+            name="updated_at",
+        ),
+    ]
@@ -43,8 +43,8 @@ class FileMetaData(models.Model):
 
     '''
 
-    filename = models.CharField(max_length=255)
-    display_filename = models.CharField(max_length=255)
+    filename = models.CharField(max_length=255, db_index=True)
+    display_filename = models.CharField(max_length=255, db_index=True)
     backend_uuid = models.CharField(max_length=255, null=True)
     user = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
     group = models.ForeignKey(Group, on_delete=models.CASCADE)
@@ -61,6 +61,24 @@ class FileMetaData(models.Model):
             return str(self.display_filename)
         return str(str(self.display_filename)[:max_len-3]+'...')
 
+    def save(self, *args, **kwargs):
+        '''Save the instance, and propagate the display filename to the
+        ProcessSteps which store a copy of it'''
+
+        is_new = self._state.adding
+        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        if is_new or (update_fields is not None and 'display_filename' not in update_fields):
+            return
+
+        self.processed_to.update(                                       # pylint: disable=no-member
+            infile_display_name=self.display_filename,
+        )
+        self.processed_by.update(                                       # pylint: disable=no-member
+            outfile_display_name=self.display_filename,
+        )
+
     def get_newest_descendant(self):
         '''Get the most recently created FileMetaData object which is a direct
         descendant of this FileMetaData'''
@@ -120,6 +138,13 @@ class Application(models.Model):
 
     active = models.BooleanField(default=True)
 
+    class Meta:                                            # pylint: disable=too-few-public-methods
+        '''Additional model configuration'''
+
+        # Applications are looked up by (name, version) when syncing with
+        # the backend
+        indexes = [models.Index(fields=['name', 'version'])]
+
     def __str__(self):
         '''Return the name when an instance of this is parsed as string'''
 
@@ -194,9 +219,13 @@ class ProcessStep(models.Model):
     - command(AppCommand): the AppCommand instance which corresponds to
             the application command used for this process.
     - infile(FileMetaData): the metadata of the Dataset provided as input.
+    - infile_display_name(str): a copy of the infile's display_filename,
+            kept so that dataset history trees can be built from
+            ProcessSteps alone.
     - outfile(FileMetaData): the metadata of the Dataset yielded as output.
-    - parameters(str): a JSON-serialised dictionary of parameters and their
-            values used in this process.
+    - outfile_display_name(str): a copy of the outfile's display_filename.
+    - parameters(dict): a dictionary of parameters and their values used in
+            this process, stored as JSON.
 
     '''
 
@@ -217,10 +246,18 @@ class ProcessStep(models.Model):
         on_delete=models.SET_NULL,
         related_name='processed_by'
     )
-    parameters = models.CharField(
-        max_length=255,
-        default='{}',
-    )
+    infile_display_name = models.CharField(max_length=255, blank=True, default='')
+    outfile_display_name = models.CharField(max_length=255, blank=True, default='')
+    parameters = models.JSONField(default=dict)
+
+    def save(self, *args, **kwargs):
+        '''Save the instance, refreshing the stored copies of the infile and
+        outfile display filenames'''
+
+        self.infile_display_name = self.infile.display_filename if self.infile else '' # pylint: disable=no-member
+        self.outfile_display_name = self.outfile.display_filename if self.outfile else '' # pylint: disable=no-member
+
+        super().save(*args, **kwargs)
 
 
 class SessionReference(models.Model):
@@ -5,19 +5,86 @@ Plotly Dash app in the QCrBox Frontend
 
 '''
 
-import ast
+import copy
+import hashlib
+from collections import defaultdict
 
 import plotly.express as px
 import plotly.graph_objects as go
 
+from django.conf import settings
+from django.core.cache import cache
 from django.urls import reverse
 
 from dash import dcc, html
 
 from qcrbox import models, utility
 
+# Command parameters which shouldn't be displayed in the infobox
+HIDDEN_PARAMS = frozenset((
+    'cif1',
+    'input_cif',
+    'output_cif_path',
+    'output_json_path',
+    'output_tsc_path',
+))
+
+# Plotting kwargs common to all 'point' plots
+POINT_KWARGS = {
+    'mode':'markers+text',
+    'textposition':'bottom center',
+    'name':'',
+}
+
+# The number of nodes above which tree plot points are rendered with WebGL
+# rather than SVG.  All points share one trace, so SVG copes well below this.
+WEBGL_THRESHOLD = 1000
+
+# Plotting kwargs common to all 'connector' plots
+CONNECTOR_KWARGS = {
+    'mode':'lines',
+    'line':{'color' : 'rgba(0, 0, 0, 0.2)'},
+    'hovertemplate':'',
+    'zorder':-1,
+    'hoverinfo':'none',
+}
+
+# Layout kwargs for the tree plot, hiding axes and making the background transparent
+TREE_LAYOUT_KWARGS = {
+    'xaxis_title':None,
+    'yaxis_title':None,
+    'xaxis_showgrid':False,
+    'yaxis_showgrid':False,
+    'xaxis_showticklabels':False,
+    'yaxis_showticklabels':False,
+    'xaxis_zeroline':False,
+    'yaxis_zeroline':False,
+    'showlegend':False,
+    'plot_bgcolor':'rgba(0, 0, 0, 0)',
+    'paper_bgcolor':'rgba(0, 0, 0, 0)',
+    'margin':{'l':0, 'r':0, 't':10, 'b':10},
+    'autosize':True,
+}
+
+# Style for the label column of the infobox table
+LABEL_STYLE = {'text-align':'right'}
+
+# Graph component which tree plot figures are inserted into
+TREE_GRAPH_TEMPLATE = dcc.Graph(
+    figure={},
+    style={
+        'width': '100%',
+        'height': '100%;',
+    },
+    id='tree-plot',
+    config={'displayModeBar':False},
+)
+
 def tree_plot(seed_dataset):
-    '''Generate the main Tree Plot for the History Dashboard
+    '''Generate the main Tree Plot for the History Dashboard.  The figure
+    itself is cached, keyed on the history it is drawn from, so that
+    revisiting a node whose history has not changed skips rebuilding the
+    figure.
 
     Parameters:
     - seed_dataset(FileMetaData): the FileMetaData model instance
@@ -31,101 +98,132 @@ def tree_plot(seed_dataset):
 
     '''
 
-    # Plotting kwargs common to all 'point' plots
-    point_kwargs = {
-        'mode':'markers+text',
-        'textposition':'bottom center',
-        'name':'',
-    }
-
-    # Plotting kwargs common to all 'connector' plots
-    connector_kwargs = {
-        'mode':'lines',
-        'line':{'color' : 'rgba(0, 0, 0, 0.2)'},
-        'hovertemplate':'',
-        'zorder':-1,
-        'hoverinfo':'none',
-    }
-
-    # Plot the point for the seed dataset.
-    fig = px.scatter()
+    ancestors, children = tree_history(seed_dataset)
+
+    # Key on everything the figure is drawn from, so any change to the
+    # history (however it was written) gives a new key
+    history_key = hashlib.md5(repr((
+        seed_dataset.pk,
+        seed_dataset.display_filename,
+        ancestors,
+        sorted(children.items()),
+    )).encode()).hexdigest()
+
+    figure = cache.get_or_set(
+        f'tree:{history_key}',
+        lambda: tree_figure(seed_dataset, ancestors, children).to_plotly_json(),
+        settings.TREE_PLOT_CACHE_TIME,
+    )
 
-    fig.add_trace(go.Scatter(
-        x=[0],
-        y=[0],
-        marker={'color':'red','size': 19},
-        text=seed_dataset.display_filename,
-        hovertemplate='Current Selection',
-        customdata=(seed_dataset.pk,),
-        **point_kwargs,
-    ))
+    graph_object = copy.copy(TREE_GRAPH_TEMPLATE)
+    graph_object.figure = figure
 
-    # Plot ancestors
-    def plot_ancestors(fig, dataset, current_layer=0):
-        '''Recursively find all ancestors of a given dataset and add points
-        for them to a tree plot
+    return graph_object
 
-        Parameters:
-        - fig(Figure): Plotly figure object containing the tree plot
-        - dataset: The current dataset to find ancestors of
-        - current_layer(int, optional): The 'generation' of the current
-                dataset being worked on.  The seed data for the tree plot is
-                at layer 0, its parent is at layer 1, grandparent is at layer
-                2, etc.  Leave this value as the default 0 when calling this
-                function, it is used internally to pass information to
-                recursive calls.
+def tree_history(seed_dataset):
+    '''Fetch the ancestors and descendants of a dataset, as drawn in the main
+    Tree Plot for the History Dashboard
 
-        Returns:
-        - fig(Figure): The annotated Plotly figure object with added
-                datapoints for the chosen dataset's ancestors.
-        - max_generation(int): The maximum generation found, e.g. +1 for
-                parent, +2 for grandparent, etc.
+    Parameters:
+    - seed_dataset(FileMetaData): the FileMetaData model instance
+            corresponding to the data being used as the 'seed' for the tree
+            plot.
 
-        '''
+    Returns:
+    - ancestors(list): (pk, display name) tuples of the ancestors of the seed
+            dataset, starting with its parent.
+    - children(dict): lists of (pk, display name) tuples of the children of
+            each dataset in the seed dataset's subtree, keyed by the pk of
+            their parent.
 
-        # Assume the max generation is the current one unless told otherwise
-        max_generation = current_layer
+    '''
+
+    process_objs = models.ProcessStep.objects                           # pylint: disable=no-member
+
+    # Walk back through the ancestors, one query per generation
+    ancestors = []
+    dataset_pk = seed_dataset.pk
+    while True:
+        prev_process = process_objs.filter(outfile_id=dataset_pk).values_list(
+            'infile_id',
+            'infile_display_name',
+        ).first()
+
+        if not prev_process or prev_process[0] is None:
+            break
+
+        ancestors.append(prev_process)
+        dataset_pk = prev_process[0]
+
+    # Fetch all descendants, one query per generation, as lists of
+    # (pk, display name) keyed by the pk of their parent
+    children = defaultdict(list)
+    generation_pks = [seed_dataset.pk]
+    while generation_pks:
+        post_processes = process_objs.filter(infile_id__in=generation_pks)
+        post_processes = post_processes.exclude(outfile_id=None).order_by('pk')
+
+        generation_pks = []
+        for parent_pk, d_pk, d_name in post_processes.values_list(
+            'infile_id',
+            'outfile_id',
+            'outfile_display_name',
+        ):
+            children[parent_pk].append((d_pk, d_name))
+            generation_pks.append(d_pk)
+
+    return ancestors, children
+
+def tree_figure(seed_dataset, ancestors, children):
+    '''Build the figure for the main Tree Plot for the History Dashboard
+
+    Parameters:
+    - seed_dataset(FileMetaData): the FileMetaData model instance
+            corresponding to the data being used as the 'seed' for the tree
+            plot, i.e. the central node which is labelled as currently
+            selected.
+    - ancestors(list): the ancestors of the seed dataset, as returned by
+            tree_history().
+    - children(dict): the descendants of the seed dataset, as returned by
+            tree_history().
 
-        try:
-            process_objs = models.ProcessStep.objects                   # pylint: disable=no-member
-            prev_process = process_objs.get(outfile=dataset)
-        except models.ProcessStep.DoesNotExist:                         # pylint: disable=no-member
-            prev_process = None
+    Returns:
+    - fig(Figure): the Plotly figure object containing the tree plot.
 
-        if prev_process:
-            ancestor = prev_process.infile
+    '''
 
-            # Plot point for ancestor
-            fig.add_trace(go.Scatter(
-                x=[0],
-                y=[current_layer + 1],
-                marker={'color':'blue','size': 15},
-                text=ancestor.display_filename,
-                customdata=(ancestor.pk,),
-                hovertemplate=f'Go to {ancestor.display_filename}',
-                **point_kwargs,
-            ))
+    # Collect every node and connecting line first, so that each can be
+    # drawn as a single trace rather than one trace per node or line
+    points = []
+    connector_x = []
+    connector_y = []
 
-            # Plot connecting line
-            fig.add_trace(go.Scatter(
-                x=[0, 0],
-                y=[current_layer, current_layer + 1],
-                **connector_kwargs,
-            ))
+    def add_connector(x, y):
+        '''Add a connecting line, separated from the others by a gap'''
 
-            fig, max_generation = plot_ancestors(fig, ancestor, current_layer=current_layer + 1)
+        connector_x.extend((*x, None))
+        connector_y.extend((*y, None))
 
-        return fig, max_generation
+    # Add the point for the seed dataset.
+    points.append((0, 0, seed_dataset.pk, seed_dataset.display_filename,
+                   'Current Selection', 'red', 19))
 
-    fig, max_generation = plot_ancestors(fig, seed_dataset)
+    # Add ancestors, moving one generation up with each
+    for layer, (ancestor_pk, ancestor_name) in enumerate(ancestors):
 
-    def plot_descendants(fig, dataset, current_layer=0, x_offset=0, x_width=100):
-        '''Recursively find all descendants of a given dataset and add points
-        for them to a tree plot
+        points.append((0, layer + 1, ancestor_pk, ancestor_name,
+                       f'Go to {ancestor_name}', 'blue', 15))
+        add_connector((0, 0), (layer, layer + 1))
+
+    max_generation = len(ancestors)
+
+    def plot_descendants(dataset_pk, current_layer=0, x_offset=0, x_width=100):
+        '''Recursively walk the prefetched descendants of a given dataset
+        and add points and connecting lines for them to the tree plot
 
         Parameters:
-        - fig(Figure): Plotly figure object containing the tree plot
-        - dataset: The current dataset to find descendants of
+        - dataset_pk(int): The pk of the current dataset to find descendants
+                of
         - current_layer(int, optional): The 'generation' of the current
                 dataset being worked on.  The seed data for the tree plot is
                 at layer 0, its children are at layer -1, grandchildren are at
@@ -141,54 +239,39 @@ def tree_plot(seed_dataset):
                 calls to govern horizontal spacing of subtrees.
 
         Returns:
-        - fig(Figure): The annotated Plotly figure object with added
-                datapoints for the chosen dataset's descendants.
+        - min_generation(int): The layer of the deepest descendant of the
+                chosen dataset.
 
         '''
 
         # Assume the max generation is the current one unless told otherwise
         min_generation = current_layer
 
-        process_objs = models.ProcessStep.objects                       # pylint: disable=no-member
-        post_processes = process_objs.filter(infile=dataset)
-        descendant_pks = list(post_processes.values_list('outfile', flat=True))
+        descendants = children.get(dataset_pk, [])
 
-        n_children = len(descendant_pks)
+        n_children = len(descendants)
 
         # Indexer to calculate horizontal positioning of each child
         i = 1
 
         # Track the number of generations of dependents
 
-        for d_pk in descendant_pks:
-
-            descendant = models.FileMetaData.objects.get(pk=d_pk)       # pylint: disable=no-member
+        for d_pk, d_name in descendants:
 
             # Ensure that the points for each child are reasonably spaced,
             # while still vaguely below their parent
             h_pos = x_offset - (x_width / 2.) + ((i / (n_children + 1)) * x_width )
 
-            # Plot point for descendant
-            fig.add_trace(go.Scatter(
-                x=[h_pos],
-                y=[current_layer-1],
-                marker={'color':'blue','size': 15},
-                text=utility.twrap(descendant.display_filename, int(x_width//n_children)),
-                customdata=(descendant.pk,),
-                hovertemplate=f'Go to {descendant.display_filename}',
-                **point_kwargs,
-            ))
-
-            # Plot connecting line
-            fig.add_trace(go.Scatter(
-                x=[x_offset, h_pos, h_pos],
-                y=[current_layer, current_layer, current_layer-1],
-                **connector_kwargs,
-            ))
-
-            fig, end_generation = plot_descendants(
-                fig,
-                descendant,
+            points.append((h_pos, current_layer - 1, d_pk,
+                           utility.twrap(d_name, int(x_width//n_children)),
+                           f'Go to {d_name}', 'blue', 15))
+            add_connector(
+                (x_offset, h_pos, h_pos),
+                (current_layer, current_layer, current_layer-1),
+            )
+
+            end_generation = plot_descendants(
+                d_pk,
                 current_layer=current_layer-1,
                 x_offset=h_pos,
                 x_width=x_width/n_children,
@@ -198,25 +281,34 @@ def tree_plot(seed_dataset):
 
             i+=1
 
-        return fig, min_generation
-
-    fig, min_generation = plot_descendants(fig, seed_dataset)
-
-    fig.update_layout(
-        xaxis_title=None,
-        yaxis_title=None,
-        xaxis_showgrid=False,
-        yaxis_showgrid=False,
-        xaxis_showticklabels=False,
-        yaxis_showticklabels=False,
-        xaxis_zeroline=False,
-        yaxis_zeroline=False,
-        showlegend=False,
-        plot_bgcolor='rgba(0, 0, 0, 0)',
-        paper_bgcolor='rgba(0, 0, 0, 0)',
-        margin={'l':0, 'r':0, 't':10, 'b':10},
-        autosize=True,
-    )
+        return min_generation
+
+    min_generation = plot_descendants(seed_dataset.pk)
+
+    fig = px.scatter()
+
+    # Connectors stay SVG, as they rely on zorder to sit behind the points
+    fig.add_trace(go.Scatter(
+        x=connector_x,
+        y=connector_y,
+        **CONNECTOR_KWARGS,
+    ))
+
+    # Only switch to WebGL rendering for the points of very large trees
+    point_trace = go.Scattergl if len(points) > WEBGL_THRESHOLD else go.Scatter
+    point_x, point_y, point_pks, point_text, point_hover, colors, sizes = zip(*points)
+
+    fig.add_trace(point_trace(
+        x=point_x,
+        y=point_y,
+        marker={'color':colors, 'size':sizes},
+        text=point_text,
+        customdata=point_pks,
+        hovertemplate=point_hover,
+        **POINT_KWARGS,
+    ))
+
+    fig.update_layout(**TREE_LAYOUT_KWARGS)
 
     # Fetch yrange to generate custom y-axis padding
     yrange = max_generation - min_generation
@@ -227,17 +319,7 @@ def tree_plot(seed_dataset):
     fig.layout.xaxis.fixedrange = True
     fig.layout.yaxis.fixedrange = True
 
-    graph_object = dcc.Graph(
-        figure=fig,
-        style={
-            'width': '100%',
-            'height': '100%;',
-        },
-        id='tree-plot',
-        config={'displayModeBar':False},
-    )
-
-    return graph_object
+    return fig
 
 def infobox(seed_dataset):
 
@@ -257,7 +339,7 @@ def infobox(seed_dataset):
         '''Simple function to generate 2-width html table row'''
 
         row = html.Tr([
-            html.Td(f'{name}\xa0', style={'text-align':'right'}),
+            html.Td(f'{name}\xa0', style=LABEL_STYLE),
             html.Td(data),
         ])
 
@@ -284,25 +366,17 @@ def infobox(seed_dataset):
 
     process_objs = models.ProcessStep.objects                           # pylint: disable=no-member
     creation_process = process_objs.filter(outfile=seed_dataset)
+    process = creation_process.select_related('command__app').first()
 
-    if creation_process.exists():
+    if process:
 
-        process = creation_process.first()
         app = process.command.app.name
         version = process.command.app.version
         command = process.command.name
-        parent = process.infile.display_filename
-        params = ast.literal_eval(process.parameters)
-
-        # Remove some params which shouldnt be displayed in the table
-        for hidden_param in [
-            'cif1',
-            'input_cif',
-            'output_cif_path',
-            'output_json_path',
-            'output_tsc_path',
-        ]:
-            params.pop(hidden_param, None)
+        parent = process.infile_display_name
+        params = {
+            p: v for p, v in process.parameters.items() if p not in HIDDEN_PARAMS
+        }
 
     else:
 
@@ -312,27 +386,22 @@ def infobox(seed_dataset):
         parent = '-'
         params = {}
 
-    creation_table_1 = [
-        table_row('Application: ', app),
-        table_row('Version: ', version),
-        table_row('Command: ', command),
-        table_row('Parent Dataset: ', parent),
-    ]
-
-    creation_table_2 = [
-        table_row('User: ', seed_dataset.user.username),
-        table_row('Date: ', seed_dataset.creation_time.strftime('%Y-%m-%d')),
-        table_row('Time: ', seed_dataset.creation_time.strftime('%H:%M:%S')+' UTC+0'),
-    ]
-
-    params_table = [
-        table_row(
-            p.replace('_', ' ').title() + ': ',
-            v,
-        ) for p, v in params.items()
+    creation_date, creation_time = seed_dataset.creation_time.strftime(
+        '%Y-%m-%d %H:%M:%S'
+    ).split(' ')
+
+    creation_rows = [
+        ('Application: ', app),
+        ('Version: ', version),
+        ('Command: ', command),
+        ('Parent Dataset: ', parent),
+        *((p.replace('_', ' ').title() + ': ', v) for p, v in params.items()),
+        ('User: ', seed_dataset.user.username),
+        ('Date: ', creation_date),
+        ('Time: ', creation_time+' UTC+0'),
     ]
 
-    table_contents += creation_table_1 + params_table + creation_table_2
+    table_contents += [table_row(name, data) for name, data in creation_rows]
 
     # Create button to launch workflow
 
@@ -343,4 +412,4 @@ def infobox(seed_dataset):
     )
 
     return [
-        html.Table(table_contents), html.Br(), workflow_button]
+        html.Table(html.Tbody(table_contents)), html.Br(), workflow_button]
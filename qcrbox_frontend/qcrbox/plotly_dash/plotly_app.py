@@ -8,6 +8,7 @@ import logging
 
 from dash import html, _dash_renderer
 from dash.dependencies import Input, Output
+from dash.exceptions import PreventUpdate
 from django.templatetags.static import static
 
 import dash_bootstrap_components as dbc
@@ -99,25 +100,28 @@ app.layout = dbc.Container(
     Input('tree-plot', 'clickData'))
 def get_seed_from_click_data(click_data):
     '''Callback to detect the user clicking a datapoint in the tree plot and
-    cache the pk of the relevant dataset in local de facto storage
+    cache the pk of the relevant dataset in local de facto storage.  Does
+    nothing if there is no click data (e.g. when the tree plot is first
+    rendered), to avoid redrawing the dashboard a second time.
 
     '''
 
     if not click_data:
-        return None
+        raise PreventUpdate
     seed_pk = click_data['points'][0]['customdata']
     return seed_pk
 
 @app.callback(
     Output('tree-container', 'children'),
+    Output('infobox-container', 'children'),
     Input('pk', 'title'),
     Input('init_pk', 'title'))
 def display_data_for_seed(seed_data, init_seed):
-    '''Callback to detect changes in local storage and update the graph based
-    on the new seed data pk.  Includes a failsafe; if the storage does not
-    contain a valid pk (i.e. on first loading this dashboard), instead load
-    the plot for the default pk value passed in django context via the view
-    method.
+    '''Callback to detect changes in local storage and update the graph and
+    infobox based on the new seed data pk.  Includes a failsafe; if the
+    storage does not contain a valid pk (i.e. on first loading this
+    dashboard), instead load the plot and infobox for the default pk value
+    passed in django context via the view method.
 
     '''
 
@@ -125,22 +129,5 @@ def display_data_for_seed(seed_data, init_seed):
         seed_data=init_seed
     LOGGER.info('Generating tree plot for dataset pk=%s',seed_data)
     metadata_objs = models.FileMetaData.objects                         # pylint: disable=no-member
-    return graphs.tree_plot(metadata_objs.get(pk=int(seed_data)))
-
-@app.callback(
-    Output('infobox-container', 'children'),
-    Input('pk', 'title'),
-    Input('init_pk', 'title'))
-def display_infobox_for_seed(seed_data, init_seed):
-    '''Callback to detect changes in local storage and update the infobox
-    based on the new seed data pk.  Includes a failsafe; if the storage does
-    not contain a valid pk (i.e. on first loading this dashboard), instead
-    load the infobox for the default pk value passed in django context via the
-    view method.
-
-    '''
-
-    if not seed_data:
-        seed_data=init_seed
-    metadata_objs = models.FileMetaData.objects                         # pylint: disable=no-member
-    return graphs.infobox(metadata_objs.get(pk=int(seed_data)))
+    seed_dataset = metadata_objs.select_related('group', 'user').get(pk=int(seed_data))
+    return graphs.tree_plot(seed_dataset), graphs.infobox(seed_dataset)
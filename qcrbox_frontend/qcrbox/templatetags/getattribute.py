@@ -1,23 +1,42 @@
 '''Template tag to allow getting an attribute of an object dynamically
 from a string name within a Django HTML template'''
 
+from collections.abc import Mapping
+from functools import lru_cache
+
 from django import template
 
 register = template.Library()
 
+# Sentinel for attributes which could not be found
+MISSING = object()
+
+@lru_cache(maxsize=512)
+def compile_chain(arg):
+    '''Build a cached resolver function for a '__'-separated attribute
+    chain, so each chain is only split once however many rows use it'''
+
+    chain = tuple(arg.split('__'))
+
+    def resolve(value):
+        '''Walk the attribute chain from a given object'''
+
+        # Allow for seeking within child objects using standard django parsing
+        for arg_att in chain:
+            attr = getattr(value, arg_att, MISSING)
+            if attr is not MISSING:
+                value = attr
+            elif isinstance(value, Mapping) and arg_att in value:
+                value = value[arg_att]
+            else:
+                return ''
+
+        return value
+
+    return resolve
+
 @register.filter(name='getattribute')
 def getattribute(value, arg):
     '''Template tag configuration'''
 
-    # Allow for seeking within child objects using standard django parsing
-    chain = arg.split('__')
-
-    for arg_att in chain:
-        if hasattr(value, str(arg_att)):
-            value = getattr(value, arg_att)
-        elif hasattr(value, 'has_key') and value.has_key(arg_att):
-            value = value[arg_att]
-        else:
-            return ''
-
-    return value
+    return compile_chain(arg)(value)
@@ -7,112 +7,135 @@ appropriate line of this tag is run instead and the output value is returned.
 '''
 
 from django import template
-from django.contrib.auth.models import Group, Permission
+
+from qcrbox.utility import filter_group_owners
 
 register = template.Library()
 
-def get_special_user(value, arg):
-    '''Special render options for user-related fields'''
+# The qcrbox permissions which denote a user role, and the names of those roles
+ROLE_PERMS = (
+    ('global_access', 'Admin'),
+    ('edit_data', 'Data Manager'),
+    ('edit_users', 'Group Manager'),
+)
 
-    # Fetch list of names of groups associated with a user
-    if arg == 'groups':
-        grouplist = []
+def get_role_perms(user):
+    '''Fetch the codenames of the role permissions held by a user, using the
+    qcrbox_perms prefetches (on the user and their groups) if the view
+    provided them rather than querying the permissions of each user'''
 
-        for i in value.groups.all():
-            grouplist.append(str(i))
+    if not hasattr(user, 'qcrbox_perms'):
+        return {perm for perm, _ in ROLE_PERMS if user.has_perm('qcrbox.' + perm)}
 
-        grouplist.sort()
+    # Mirror the inactive/superuser handling of User.has_perm
+    if not user.is_active:
+        return set()
+    if user.is_superuser:
+        return {perm for perm, _ in ROLE_PERMS}
 
-        return ', '.join(grouplist)
+    perms = {p.codename for p in user.qcrbox_perms}
+    for group in user.groups.all():
+        perms.update(p.codename for p in group.qcrbox_perms)
 
-    # Convert a user's permissions set into a human-readable list
-    if arg == 'role':
-        roles = []
+    return perms
 
-        for (perm, name) in [
-                ('global_access', 'Admin'),
-                ('edit_data', 'Data Manager'),
-                ('edit_users', 'Group Manager'),
-        ]:
-            if value.has_perm('qcrbox.' + perm):
-                roles.append(name)
+# Special user values:
 
-        if len(roles) == 0:
-            return 'User'
-        return ', '.join(roles)
+def get_user_groups(value):
+    '''Fetch list of names of groups associated with a user'''
 
-    # Failsafe
-    raise NotImplementedError
+    return ', '.join(sorted(str(g) for g in value.groups.all()))
 
 
-def get_special_group(value, arg):
-    '''Special render options for group-related fields'''
+def get_user_role(value):
+    '''Convert a user's permissions set into a human-readable list'''
 
-    # Fetching the number of users associated with a given group
-    if arg == 'membership':
-        group_id = value.pk
-        return Group.objects.get(pk=group_id).user_set.all().count()
+    perms = get_role_perms(value)
+    roles = [name for (perm, name) in ROLE_PERMS if perm in perms]
 
-    # Fetching the list of users with edit_user permissions
-    if arg == 'owners':
-        perm = Permission.objects.get(codename='edit_users')
-        owners = value.user_set.filter(user_permissions=perm)
+    if len(roles) == 0:
+        return 'User'
+    return ', '.join(roles)
 
-        ownerlist = []
 
-        for owner in owners:
-            ownerlist.append(str(owner))
+# Special group values:
 
-        ownerlist.sort()
+def get_group_membership(value):
+    '''Fetch the number of users associated with a given group, using the
+    user_count annotation if the view provided one'''
 
-        return ', '.join(ownerlist)
+    if hasattr(value, 'user_count'):
+        return value.user_count
+    return value.user_set.count()
 
-    # Failsafe
-    raise NotImplementedError
 
+def get_group_owners(value):
+    '''Fetch the list of users with edit_user permissions, using the
+    owners_cached prefetch if the view provided one'''
 
-def get_special_metadata(value, arg):
-    '''Special render options for metadata-related fields'''
+    if hasattr(value, 'owners_cached'):
+        owners = value.owners_cached
+    else:
+        owners = filter_group_owners(value.user_set.all())
 
-    # Get the name of the file this file was created from (e.g. via
-    # an Interactive Session)
-    if arg == 'created_from':
-        if value.processed_by.all():
-            process = value.processed_by.first()
-            if process.infile:
-                if process.infile.active:
-                    return process.infile
-                return '[File Deleted]'
-        return '-'
+    return ', '.join(sorted(str(owner) for owner in owners))
 
-    # Get the name of the Application this file was created from (e.g. via
-    # an Interactive Session)
-    if arg == 'created_app':
-        if value.processed_by.all():
-            process = value.processed_by.first()
-            if process.command:
-                return process.command.app
-        return '-'
 
-    # Failsafe
-    raise NotImplementedError
+# Special metadata values:
 
+def get_creation_process(value):
+    '''Fetch the ProcessStep which created a given dataset, or None if it was
+    uploaded, using the processed_cached prefetch if the view provided one'''
 
-@register.filter(name='getspecial')
-def getspecial(value, arg):
-    '''Template tag configuration'''
+    if hasattr(value, 'processed_cached'):
+        return value.processed_cached[0] if value.processed_cached else None
+
+    return value.processed_by.first()
+
+
+def get_metadata_created_from(value):
+    '''Get the name of the file this file was created from (e.g. via an
+    Interactive Session)'''
+
+    process = get_creation_process(value)
+    if process:
+        if process.infile:
+            if process.infile.active:
+                return process.infile
+            return '[File Deleted]'
+    return '-'
 
-    # Special user values:
-    if arg in ['groups', 'role']:
-        return get_special_user(value, arg)
 
-    # Special group values:
-    if arg in ['membership', 'owners']:
-        return get_special_group(value, arg)
+def get_metadata_created_app(value):
+    '''Get the name of the Application this file was created from (e.g. via
+    an Interactive Session)'''
 
-    # Special metadata values:
-    if arg in ['created_from', 'created_app']:
-        return get_special_metadata(value, arg)
+    process = get_creation_process(value)
+    if process:
+        if process.command:
+            return process.command.app
+    return '-'
+
+
+# The function which renders each special field
+SPECIAL_DISPATCH = {
+    'groups': get_user_groups,
+    'role': get_user_role,
+    'membership': get_group_membership,
+    'owners': get_group_owners,
+    'created_from': get_metadata_created_from,
+    'created_app': get_metadata_created_app,
+}
+
+
+@register.filter(name='getspecial')
+def getspecial(value, arg):
+    '''Template tag configuration'''
 
     # If arg doesn't match any option, raise exception
-    raise NotImplementedError
+    try:
+        special_function = SPECIAL_DISPATCH[arg]
+    except KeyError as exc:
+        raise NotImplementedError from exc
+
+    return special_function(value)
@@ -0,0 +1,63 @@
+'''QCrBox Tests
+
+Unit tests for the QCrBox Django Frontend, run with 'python manage.py test'.
+
+'''
+
+from django.contrib.auth.models import Group
+from django.test import TestCase
+
+from qcrbox import models, utility
+
+
+class NextValidFilenameTests(TestCase):
+    '''Tests for the disambiguation of clashing filenames by
+    utility.get_next_valid_filename()'''
+
+    @classmethod
+    def setUpTestData(cls):
+        '''Create a group to own the test files'''
+
+        cls.group = Group.objects.create(name='filename-tests')
+
+    def add_files(self, *filenames):
+        '''Add FileMetaData records for each of the given filenames'''
+
+        for filename in filenames:
+            models.FileMetaData.objects.create(                         # pylint: disable=no-member
+                filename=filename,
+                display_filename=filename,
+                group=self.group,
+            )
+
+    def test_unused_filename_is_kept(self):
+        '''A filename not on record is returned unchanged'''
+
+        self.assertEqual(utility.get_next_valid_filename('f1.cif'), 'f1.cif')
+
+    def test_lowest_free_index_is_used(self):
+        '''A clashing filename takes the lowest index not already in use'''
+
+        self.add_files('f1.cif', 'f1(1).cif', 'f1(3).cif')
+
+        self.assertEqual(utility.get_next_valid_filename('f1(3).cif'), 'f1(2).cif')
+
+    def test_look_alike_filenames_are_ignored(self):
+        '''Filenames which share the root and extension, but do not have the
+        form 'root(index).ext', do not count as clashes'''
+
+        self.add_files('f1.cif', 'f1(3).cif', 'f1(x)(7).cif')
+
+        self.assertEqual(utility.get_next_valid_filename('f1(3).cif'), 'f1(1).cif')
+
+    def test_free_index_from_start(self):
+        '''Display filenames are disambiguated from the given start index,
+        ignoring look-alike names'''
+
+        self.add_files('f1.cif', 'f1(2).cif', 'f1(x)(3).cif', 'f1(4).cif')
+        file_metas = models.FileMetaData.objects                        # pylint: disable=no-member
+
+        self.assertEqual(
+            utility.get_next_free_index(file_metas, 'display_filename', 'f1', '.cif', start=2),
+            3,
+        )
@@ -7,13 +7,35 @@ the QCrBox Django Frontend.
 
 import re
 import textwrap
+import threading
+from functools import lru_cache
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
 
 from qcrbox import api
 from qcrbox import models
 
+# Cache key marking that the application list was recently synced
+APP_SYNC_CACHE_KEY = 'qcrbox:apps:synced'
+
+# Held while a thread in this process is syncing the application list
+APP_SYNC_LOCK = threading.Lock()
+
+# Matches the bracketed index at the end of a filename root, e.g. 'file(2)'
+TRAILING_INDEX_PATTERN = re.compile(r'\(\d+\)$')
+
+# Matches the header of a CIF data block, e.g. 'data_mystructure'
+CIF_DATA_BLOCK_PATTERN = re.compile(rb'^[ \t]*data_\S', re.IGNORECASE | re.MULTILINE)
+
+# Number of bytes read from the start of an upload to check it is a CIF
+CIF_SNIFF_BYTES = 65536
+
 class DisplayField():
     '''A class to contain information on fields to be displayed in 'view list'
     e.g. denoting a field which should form a column of a rendered html table
@@ -21,6 +43,8 @@ class DisplayField():
 
     '''
 
+    __slots__ = ('name', 'attr', 'is_header', 'is_special')
+
     def __init__(self, name, attr, is_header=False, is_special=False):
         '''Initialise an instance of DisplayField
 
@@ -57,6 +81,12 @@ def update_applications():
     are edited to be flagged as inactive in the Frontend db.  Applications are
     uniquely identified by a tuple of the form (name, version).
 
+    A successful sync is remembered for settings.APP_SYNC_CACHE_TIME seconds,
+    during which further calls skip the API and db entirely and report no
+    changes.  Within a process, only one thread syncs at a time; others wait
+    for it to finish and then skip their own sync.  Each worker process
+    keeps its own marker, so separate processes may still each sync once.
+
     Parameters:
     None
 
@@ -69,11 +99,41 @@ def update_applications():
 
     '''
 
-    local_apps = models.Application.objects.all()                       # pylint: disable=no-member
+    no_changes = {
+        'new_apps' : [],
+        'deactivated_apps' : [],
+        'reactivated_apps' : [],
+    }
+
+    # Skip redundant syncs if the backend was checked very recently
+    if cache.get(APP_SYNC_CACHE_KEY):
+        return no_changes
+
+    # Only let one thread sync at a time, and re-check the marker once the
+    # lock is held, as the sync this thread waited on will have set it
+    with APP_SYNC_LOCK:
+        if cache.get(APP_SYNC_CACHE_KEY):
+            return no_changes
+
+        response = sync_applications()
+
+        if response is not None:
+            cache.set(APP_SYNC_CACHE_KEY, True, settings.APP_SYNC_CACHE_TIME)
+
+    return response
 
-    # Fetch slugs to represent apps known to the frontend
-    local_appdict = {(app.name, app.version) : app for app in local_apps}
-    local_appset = set(local_appdict.keys())
+
+def sync_applications():
+    '''Perform the sync with the backend described in update_applications(),
+    without any of its rate limiting or locking.
+
+    Parameters:
+    None
+
+    Returns:
+    - response(dict or None): as for update_applications().
+
+    '''
 
     api_response = api.get_applications()
 
@@ -81,38 +141,114 @@ def update_applications():
     if not api_response.is_valid:
         return None
 
-    response = {
-        'new_apps' : [],
-        'deactivated_apps' : [],
-        'reactivated_apps' : [],
+    # Key backend apps by (name, version) slugs, as for local ones, so they
+    # can be split into apps already known to the frontend, new apps and
+    # stale apps
+    backend_appdict = {
+        (app.name, app.version) : app
+        for app in api_response.body.payload.applications
+    }
+    local_appdict = get_local_apps({name for name, _ in backend_appdict})
+
+    updated_apps, reactivated_apps = diff_known_apps(local_appdict, backend_appdict)
+
+    # Build local DB entries for any missing apps, in a stable order
+    new_app_keys = sorted(backend_appdict.keys() - local_appdict.keys())
+    new_apps, new_commands, new_params = build_new_apps(
+        backend_appdict[app_key] for app_key in new_app_keys
+    )
+
+    # Flag local DB entries inactive if no longer present in the backend
+    deactivated_apps = [
+        local_appdict[app_key][0]
+        for app_key in local_appdict.keys() - backend_appdict.keys()
+        if local_appdict[app_key][1]
+    ]
+
+    write_app_changes(updated_apps, new_apps, new_commands, new_params, deactivated_apps)
+
+    return {
+        'new_apps' : [new_app.pk for new_app in new_apps],
+        'deactivated_apps' : deactivated_apps,
+        'reactivated_apps' : reactivated_apps,
     }
 
-    backend_appset = set([])
+def get_local_apps(backend_names):
+    '''Fetch the Frontend db applications relevant to a sync with the backend.
 
-    # Create local DB entries for any missing apps
-    backend_app_list = api_response.body.payload.applications
-    for app in backend_app_list:
+    Parameters:
+    - backend_names(set): the names of all applications in the backend.
 
-        backend_appset = backend_appset | set([(app.name, app.version),])
+    Returns:
+    - local_appdict(dict): (pk, active, port) tuples of the applications,
+            keyed by (name, version) tuples.
 
-        # If frontend already knows about the app, reactivate or skip
-        if (app.name, app.version) in local_appset:
+    '''
 
-            # Handle reactivating an app which was temporarily unavailable
-            current_app = local_appdict[(app.name, app.version)]
-            if not current_app.active:
-                current_app.active = True
-                current_app.save()
+    # Only active apps (which may need deactivating) and apps sharing a name
+    # with a backend app (which may need creating or reactivating) are
+    # relevant, and only the fields used to diff against the backend
+    local_apps = models.Application.objects.filter(                     # pylint: disable=no-member
+        Q(active=True) | Q(name__in=backend_names)
+    ).values_list('pk', 'name', 'version', 'active', 'port')
 
-                response['reactivated_apps'].append(current_app.pk)
+    return {
+        (name, version) : (pk, active, port)
+        for pk, name, version, active, port in local_apps
+    }
 
-            # Handle change of ports, unlikely to ever happen in deployment
-            elif current_app.port != app.gui_port:
-                current_app.port = app.gui_port
-                current_app.save()
+def diff_known_apps(local_appdict, backend_appdict):
+    '''Find the applications known to both the Frontend db and the backend
+    which need reactivating or updating.
 
-            continue
+    Parameters:
+    - local_appdict(dict): the Frontend db applications, as returned by
+            get_local_apps().
+    - backend_appdict(dict): the backend applications, keyed by
+            (name, version) tuples.
+
+    Returns:
+    - updated_apps(list): unsaved Application instances, holding only the pk
+            and the new active and port values, for bulk_update().
+    - reactivated_apps(list): the pks of the applications being reactivated.
+
+    '''
 
+    updated_apps = []
+    reactivated_apps = []
+
+    # Handle reactivating apps which were temporarily unavailable and any
+    # change of ports, unlikely to ever happen in deployment
+    for app_key in local_appdict.keys() & backend_appdict.keys():
+        gui_port = backend_appdict[app_key].gui_port
+        pk, active, port = local_appdict[app_key]
+        if not active or port != gui_port:
+            updated_apps.append(models.Application(pk=pk, active=True, port=gui_port))
+
+        if not active:
+            reactivated_apps.append(pk)
+
+    return updated_apps, reactivated_apps
+
+def build_new_apps(backend_apps):
+    '''Build (unsaved) Frontend db entries for new backend applications,
+    along with their commands and command parameters.
+
+    Parameters:
+    - backend_apps(iterable): the backend applications to add.
+
+    Returns:
+    - new_apps(list): the new Application instances.
+    - new_commands(list): the new AppCommand instances.
+    - new_params(list): the new CommandParameter instances.
+
+    '''
+
+    new_apps = []
+    new_commands = []
+    new_params = []
+
+    for app in backend_apps:
         new_app = models.Application(
             name=app.name,
             slug=app.slug,
@@ -122,72 +258,102 @@ def update_applications():
             port=app.gui_port,
             active=True,
         )
-        new_app.save()
+        new_apps.append(new_app)
 
         # Add commands to the new app
-
         for command in app.commands:
+            command_name = command.name
 
             # Ignore protected commands
-            if command.name[:2] == '__':
+            if command_name.startswith('__'):
                 continue
 
             new_command = models.AppCommand(
-                name=command.name,
+                name=command_name,
                 app=new_app,
                 description=command.description,
-                interactive=command.name=='interactive_session',
+                interactive=command_name == 'interactive_session',
             )
-
-            new_command.save()
+            new_commands.append(new_command)
 
             # Add information on the parameters to attach to the new command
-            for param_key in command.parameters.additional_properties:
-                parameter = command.parameters[param_key]
+            new_params.extend(
+                build_command_parameter(new_command, param_key, parameter)
+                for param_key, parameter in command.parameters.additional_properties.items()
+            )
 
-                if parameter['default_value']:
-                    default_value = parameter['default_value']
-                else:
-                    default_value = None
+    return new_apps, new_commands, new_params
 
-                new_param = models.CommandParameter(
-                    command = new_command,
-                    name = param_key,
-                    dtype = parameter['dtype'],
-                    description = parameter['description'],
-                    required = parameter['required'],
-                    default = default_value
-                )
+def build_command_parameter(command, param_key, parameter):
+    '''Build an (unsaved) Frontend db entry for a command parameter.
 
-                # Add any validation to the new parameter object as needed
-                validation = parameter['valid_value']
+    Parameters:
+    - command(AppCommand): the command the parameter belongs to.
+    - param_key(str): the name of the parameter.
+    - parameter(dict): the backend's description of the parameter.
 
-                if validation:
+    Returns:
+    - new_param(CommandParameter): the new CommandParameter instance.
 
-                    # Get the highest priority validation type and save it
-                    for validation_type in ('choices', 'numeric_range', 'regex'):
-                        if validation_type in validation and validation[validation_type]:
-                            new_param.validation_type = validation_type
-                            new_param.validation_value = validation[validation_type]
-                            break
+    '''
 
-                new_param.save()
+    new_param = models.CommandParameter(
+        command = command,
+        name = param_key,
+        dtype = parameter['dtype'],
+        description = parameter['description'],
+        required = parameter['required'],
+        default = parameter['default_value'] or None,
+    )
 
-        response['new_apps'].append(new_app.pk)
+    # Add any validation to the new parameter object as needed
+    validation = parameter['valid_value']
 
-    # Flag local DB entries inactive if no longer present in the backend
+    if validation:
 
-    for app in models.Application.objects.filter(active=True):          # pylint: disable=no-member
+        # Get the highest priority validation type and save it
+        for validation_type in ('choices', 'numeric_range', 'regex'):
+            if validation_type in validation and validation[validation_type]:
+                new_param.validation_type = validation_type
+                new_param.validation_value = validation[validation_type]
+                break
 
-        if (app.name, app.version) in backend_appset:
-            continue
+    return new_param
 
-        app.active = False
-        app.save()
+def write_app_changes(updated_apps, new_apps, new_commands, new_params, deactivated_apps):
+    '''Write the changes found by an application sync to the Frontend db.
 
-        response['deactivated_apps'].append(app.pk)
+    Parameters:
+    - updated_apps(list): Application instances to bulk update, as returned
+            by diff_known_apps().
+    - new_apps(list): new Application instances to create.
+    - new_commands(list): new AppCommand instances to create.
+    - new_params(list): new CommandParameter instances to create.
+    - deactivated_apps(list): the pks of Applications to flag as inactive.
 
-    return response
+    Returns:
+    None
+
+    '''
+
+    app_objs = models.Application.objects                               # pylint: disable=no-member
+    command_objs = models.AppCommand.objects                            # pylint: disable=no-member
+    param_objs = models.CommandParameter.objects                        # pylint: disable=no-member
+
+    # Write all changes in a single transaction, so that a failed sync does
+    # not leave apps without their commands or parameters
+    with transaction.atomic():
+        if updated_apps:
+            app_objs.bulk_update(updated_apps, ['active', 'port'], batch_size=500)
+
+        # Apps, then commands, must be created first so that their pks are
+        # available to the objects referring to them
+        app_objs.bulk_create(new_apps, batch_size=500)
+        command_objs.bulk_create(new_commands, batch_size=500)
+        param_objs.bulk_create(new_params, batch_size=500)
+
+        if deactivated_apps:
+            app_objs.filter(pk__in=deactivated_apps).update(active=False)
 
 
 def sanitize_command_name(command):
@@ -196,14 +362,33 @@ def sanitize_command_name(command):
 
     '''
 
-    command_name = command.name.replace('_',' ').title()
-    return command.app.name + ' : ' + command_name
+    return format_command_name(command.name, command.app.name)
+
+@lru_cache(maxsize=4096)
+def format_command_name(name, app_name):
+    '''Memoised implementation of sanitize_command_name, taking the command
+    and app names directly.
+
+    '''
+
+    return f"{app_name} : {name.replace('_', ' ').title()}"
 
+@lru_cache(maxsize=32)
+def get_text_wrapper(width):
+    '''Return a shared TextWrapper for a given line width, rather than
+    constructing a new one for every wrapped label.
+
+    '''
+
+    return textwrap.TextWrapper(width=width)
+
+@lru_cache(maxsize=2048)
 def twrap(text, width, min_width=5, max_lines=4):
     '''Simple function to split text over a given length and reconcatenate
     the pieces with plotly-recognised <br> tokens to generate newlines.
     Returns none if the returned text would be too narrow or be over too
-    many lines
+    many lines.  Results are memoised, as the same filenames are wrapped
+    to the same widths each time a tree plot is redrawn.
 
     Parameters:
     - text(str): the text to be wrapped.
@@ -219,7 +404,12 @@ def twrap(text, width, min_width=5, max_lines=4):
 
     if width < min_width:
         return ''
-    text_split = textwrap.wrap(text, width)
+
+    # Text which already fits on one line needs no wrapping
+    if len(text) <= width and text == text.strip():
+        return text
+
+    text_split = get_text_wrapper(width).wrap(text)
     if len(text_split) > max_lines:
         return ''
     return '<br>'.join(text_split)
@@ -231,53 +421,168 @@ def paginate_objects(object_list, page, per_page=13):
 
     '''
 
+    # get_page() already falls back to the first page for invalid page
+    # numbers and to the last page for out of range ones
     paginator = Paginator(object_list, per_page)
 
-    try:
-        objects = paginator.get_page(page)
-    except PageNotAnInteger:
-        objects = paginator.page(1)
-    except EmptyPage:
-        objects = paginator.page(paginator.num_pages)
+    return paginator.get_page(page)
+
+def has_global_access(request):
+    '''Check whether the user making a request has the 'qcrbox.global_access'
+    permission.  The result is stored on the request, so the check is only
+    evaluated once however many views or helpers make it.
+
+    '''
+
+    if not hasattr(request, 'qcrbox_global_access'):
+        request.qcrbox_global_access = request.user.has_perm('qcrbox.global_access')
+
+    return request.qcrbox_global_access
+
+def get_user_group_ids(user):
+    '''Get the primary keys of the groups a user belongs to.  The ids are
+    stored on the user object (as django does for permissions), so the
+    memberships are only queried once per request.
+
+    '''
+
+    if not hasattr(user, '_qcrbox_group_ids'):
+        user._qcrbox_group_ids = frozenset(                             # pylint: disable=protected-access
+            user.groups.values_list('pk', flat=True)
+        )
+
+    return user._qcrbox_group_ids                                       # pylint: disable=protected-access
+
+def filter_group_owners(users):
+    '''Filter a queryset of users down to group owners, i.e. those directly
+    granted the qcrbox edit_users permission.  Both conditions are applied in
+    one filter() call, so that they must match the same permission.
+
+    Parameters:
+    - users(QuerySet): the User queryset to be filtered.
+
+    Returns:
+    - owners(QuerySet): the filtered User queryset.
+
+    '''
 
-    return objects
+    return users.filter(
+        user_permissions__content_type__app_label='qcrbox',
+        user_permissions__codename='edit_users',
+    )
 
 def check_user_view_file_permission(user, load_file):
     ''' Check whether a given user has the permission to view a given file,
     and raise a PermissionDemied error if not'''
 
-    file_group = load_file.group
-    user_groups = user.groups.all()
+    # Permissions are cached on the user, so check these before the groups
+    if user.has_perm('qcrbox.global_access'):
+        return
 
-    shared_groups = file_group in user_groups
+    if load_file.group_id not in get_user_group_ids(user):
+        raise PermissionDenied
+
+def get_viewable_file(request, file_id, fields=()):
+    '''Fetch a FileMetaData instance which the user making a request has the
+    permission to view, checking the user's groups within the same query
+    rather than fetching the file first.
+
+    Parameters:
+    - request(WSGIRequest): the request from the user viewing the file.
+    - file_id(int): the Frontend db primary key of the file.
+    - fields(iterable of str, optional): if provided, only these fields of
+            the file are loaded.
+
+    Returns:
+    - load_file(FileMetaData): the requested file.
+
+    '''
 
-    if shared_groups or user.has_perm('qcrbox.global_access'):
-        pass
+    file_objs = models.FileMetaData.objects                             # pylint: disable=no-member
+    if fields:
+        file_objs = file_objs.only(*fields)
 
-    else:
+    if has_global_access(request):
+        return get_object_or_404(file_objs, pk=file_id)
+
+    # Files outside the user's groups are indistinguishable from missing ones
+    load_file = file_objs.filter(pk=file_id, group__user=request.user.pk).first()
+    if load_file is None:
         raise PermissionDenied
 
+    return load_file
+
+def looks_like_cif(file):
+    '''Check the start of an uploaded file for the contents of a CIF, i.e. a
+    text file containing a data block header, so that malformed uploads can
+    be rejected before being sent to the API.
+
+    Parameters:
+    - file(UploadedFile): the file uploaded by the user.
+
+    Returns:
+    - is_cif(bool): whether the file appears to be a CIF.
+
+    '''
+
+    head = file.read(CIF_SNIFF_BYTES)
+    file.seek(0)
+
+    # Binary files are not CIFs
+    if b'\x00' in head:
+        return False
+
+    return CIF_DATA_BLOCK_PATTERN.search(head) is not None
+
 def get_next_valid_filename(filename):
     ''' Check whether a proposed output filename already exists on record and,
     if so, modify it to prevent a clash.'''
 
     file_metas = models.FileMetaData.objects                            # pylint: disable=no-member
-    inv_filenames = file_metas.values_list('filename', flat=True)
-    if not filename in inv_filenames:
+    if not file_metas.filter(filename=filename).exists():
         return filename
 
     fname_components = filename.split('.')
     fn_root = fname_components[0]
     fn_ext = fname_components[-1]
 
-    fn_root = re.sub(r'\(\d+\)$', '', fn_root)
-    if not f'{fn_root}.{fn_ext}' in inv_filenames:
+    fn_root = TRAILING_INDEX_PATTERN.sub('', fn_root)
+    if not file_metas.filter(filename=f'{fn_root}.{fn_ext}').exists():
         return f'{fn_root}.{fn_ext}'
 
-    f_ind = 1
-
     # Find the next valid pattern 'filename_root(x).ext' which is not already in use
-    while True:
-        if not f'{fn_root}({f_ind}).{fn_ext}' in inv_filenames:
-            return f'{fn_root}({f_ind}).{fn_ext}'
-        f_ind += 1
+    f_ind = get_next_free_index(file_metas, 'filename', fn_root, f'.{fn_ext}')
+
+    return f'{fn_root}({f_ind}).{fn_ext}'
+
+def get_next_free_index(queryset, field, root, ext, start=1):
+    '''Find the lowest bracketed index, e.g. the 2 in 'file(2).cif', which is
+    not already used by a name of the form 'root(index)ext' in a given field
+    of a queryset.
+
+    Parameters:
+    - queryset(QuerySet): the records whose names could clash.
+    - field(str): the name of the field holding the names.
+    - root(str): the name before the bracketed index.
+    - ext(str): the name after the bracketed index, including the '.'.
+    - start(int, optional): the lowest index which may be returned.
+
+    Returns:
+    - index(int): the lowest free index.
+
+    '''
+
+    # Only fetch names which could clash, then check each matches the whole
+    # pattern, so look-alike names such as 'root(x)(7).ext' are ignored
+    pattern = re.compile(rf'{re.escape(root)}\(([1-9][0-9]*)\){re.escape(ext)}')
+    names = queryset.filter(**{
+        f'{field}__startswith': f'{root}(',
+        f'{field}__endswith': f'){ext}',
+    }).values_list(field, flat=True)
+    used = {int(match.group(1)) for match in map(pattern.fullmatch, names) if match}
+
+    index = start
+    while index in used:
+        index += 1
+
+    return index
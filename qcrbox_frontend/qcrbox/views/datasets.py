@@ -10,18 +10,37 @@ views.
 
 import logging
 
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import permission_required, login_required
+from django.db.models import Prefetch
 from django.http import HttpResponse
+from django.utils.http import content_disposition_header
 
 from qcrbox import api, models
 from qcrbox.plotly_dash import plotly_app                           # pylint: disable=unused-import
-from qcrbox.utility import check_user_view_file_permission, DisplayField, paginate_objects
+from qcrbox.utility import (
+    check_user_view_file_permission,
+    DisplayField,
+    get_user_group_ids,
+    get_viewable_file,
+    has_global_access,
+    paginate_objects,
+)
 
 LOGGER = logging.getLogger(__name__)
 
+# Columns shown in the view datasets list
+DATASET_FIELDS = (
+    DisplayField('Filename', 'display_filename', is_header=True),
+    DisplayField('Group', 'group'),
+    DisplayField('Created By', 'user'),
+    DisplayField('At Time', 'creation_time'),
+    DisplayField('From File', 'created_from', is_special=True),
+    DisplayField('With App', 'created_app', is_special=True),
+)
+
 
 @login_required(login_url='login')
 def history_dashboard(request, dataset_id):
@@ -53,23 +72,28 @@ def view_datasets(request):
 
     '''
 
-    fields = [
-        DisplayField('Filename', 'display_filename', is_header=True),
-        DisplayField('Group', 'group'),
-        DisplayField('Created By', 'user'),
-        DisplayField('At Time', 'creation_time'),
-        DisplayField('From File', 'created_from', is_special=True),
-        DisplayField('With App', 'created_app', is_special=True),
-        ]
-
     object_list = models.FileMetaData.objects.filter(active=True)       # pylint: disable=no-member
 
-    # If a user can view unaffiliated data, they can view it all
-    if request.user.has_perm('qcrbox.global_access'):
-        pass
-    else:
-        object_list = object_list.filter(group__in=request.user.groups.all())
-
+    # If a user can view unaffiliated data, they can view it all; otherwise
+    # filter on the ids of the user's groups, which are fetched once per
+    # request, so the list query needs no join through the group tables
+    # (superusers are already short-circuited by has_perm)
+    if not has_global_access(request):
+        object_list = object_list.filter(group_id__in=get_user_group_ids(request.user))
+
+    # Join the group and user shown in each row, and prefetch the creation
+    # history used by the 'special' fields, to save queries per rendered row
+    process_objs = models.ProcessStep.objects                           # pylint: disable=no-member
+    object_list = object_list.select_related('group', 'user').prefetch_related(Prefetch(
+        'processed_by',
+        queryset=process_objs.select_related('infile', 'command__app').order_by('pk'),
+        to_attr='processed_cached',
+    ))
+
+    # Only load the columns rendered in the list
+    object_list = object_list.only(
+        'display_filename', 'creation_time', 'group__name', 'user__username',
+    )
     object_list = object_list.order_by('group__name', 'filename')
     page = request.GET.get('page')
 
@@ -78,7 +102,7 @@ def view_datasets(request):
     return render(request, 'view_list_generic.html', {
         'objects': objects,
         'type':'Dataset',
-        'fields':fields,
+        'fields':DATASET_FIELDS,
         'edit_perms':request.user.has_perm('qcrbox.edit_data'),
         'delete_link':'delete_dataset',
         'history_link':'dataset_history',
@@ -105,25 +129,29 @@ def delete_dataset(request, dataset_id):
 
     '''
 
-    deletion_data_meta = models.FileMetaData.objects.get(pk=dataset_id) # pylint: disable=no-member
+    instance = get_object_or_404(models.FileMetaData, pk=dataset_id)
 
     # Check credentials before invoking the generic delete, as API will also need calling
-    check_user_view_file_permission(request.user, deletion_data_meta)
+    check_user_view_file_permission(request.user, instance)
 
     LOGGER.info(
         'User %s deleting dataset %s',
         request.user.username,
-        deletion_data_meta.display_filename,
+        instance.display_filename,
     )
-    api.get_dataset(deletion_data_meta.backend_uuid)
-    api_response = api.delete_dataset(deletion_data_meta.backend_uuid)
+    api_response = api.delete_dataset(instance.backend_uuid)
 
     if not api_response.is_valid:
         LOGGER.warning('Delete request unsuccessful!')
 
-        # Check if file is also missing from the backend
-        get_response = api.get_dataset(deletion_data_meta.backend_uuid)
-        if not (get_response.is_valid) and get_response.body.error.code == 404:
+        # A 404 from the delete means the file is already missing from the
+        # backend; for any other error, check whether it is still there
+        already_absent = api_response.body.error.code == 404
+        if not already_absent:
+            get_response = api.get_dataset(instance.backend_uuid)
+            already_absent = not get_response.is_valid and get_response.body.error.code == 404
+
+        if already_absent:
             LOGGER.info('Dataset already absent from backend; marking as deleted')
 
         else:
@@ -131,21 +159,9 @@ def delete_dataset(request, dataset_id):
             messages.warning(request, 'API delete request unsuccessful: file not deleted!')
             return redirect('view_datasets')
 
-    try:
-        instance = models.FileMetaData.objects.get(pk=dataset_id)       # pylint: disable=no-member
-
-    except models.FileMetaData.DoesNotExist:                            # pylint: disable=no-member
-        LOGGER.info(
-            'User %s attempted to deactivate non-existent File Metadata (pk=%d)',
-            request.user.username,
-            dataset_id,
-        )
-        messages.success(request, 'Dataset was deleted successfully.')
-        return redirect('view_datasets')
-
     # Don't actually delete the local metadata, just flag it as inactive so history can be preserved
     instance.active = False
-    instance.save()
+    instance.save(update_fields=['active'])
 
     LOGGER.info(
         'User %s flagged File Metadata "%s" as inactive.',
@@ -173,11 +189,11 @@ def download(request, file_id):
 
     '''
 
-    # Fetch the metadata
-    download_file_meta = models.FileMetaData.objects.get(pk=file_id)    # pylint: disable=no-member
-
-    # Stop user accessing data from a group they have no access to
-    check_user_view_file_permission(request.user, download_file_meta)
+    # Fetch the metadata, stopping the user accessing data from a group they
+    # have no access to
+    download_file_meta = get_viewable_file(
+        request, file_id, fields=('backend_uuid', 'display_filename'),
+    )
 
     LOGGER.info(
         'User %s downloading dataset "%s"',
@@ -193,10 +209,12 @@ def download(request, file_id):
 
     data = api_response.body
 
-    # Deliver the file using the filename stored in metadata
+    # Deliver the file using the filename stored in metadata, quoted so that
+    # names containing spaces or non-ASCII characters survive intact
     httpresponse = HttpResponse(data)
-    d_filename = download_file_meta.display_filename
-    httpresponse['Content-Disposition'] = 'attachment; filename=' + d_filename
+    httpresponse['Content-Disposition'] = content_disposition_header(
+        True, download_file_meta.display_filename,
+    )
     return httpresponse
 
 @login_required(login_url='login')
@@ -217,11 +235,9 @@ def visualise(request, dataset_id):
 
     '''
 
-    # Fetch the metadata
-    visualise_file_meta = models.FileMetaData.objects.get(pk=dataset_id)# pylint: disable=no-member
-
-    # Stop user accessing data from a group they have no access to
-    check_user_view_file_permission(request.user, visualise_file_meta)
+    # Fetch the metadata, stopping the user accessing data from a group they
+    # have no access to
+    visualise_file_meta = get_viewable_file(request, dataset_id, fields=('backend_uuid',))
 
     # Get host name without port, manually prepend http:// to stop django
     # treating this as a relative URL
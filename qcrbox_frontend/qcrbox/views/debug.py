@@ -8,11 +8,10 @@ Contains views pertaining to Debugging and admin panels.
 '''
 
 import logging
-import os
 
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
-from django.views.static import serve
+from django.http import FileResponse, Http404
 
 from qcrbox.plotly_dash import plotly_app                           # pylint: disable=unused-import
 
@@ -29,4 +28,11 @@ def frontend_logs(request):
     if not request.user.is_superuser:
         raise PermissionDenied
     filepath = 'qcrbox.log'
-    return serve(request, os.path.basename(filepath), os.path.dirname(filepath))
+
+    # Hand the open file to the server's file wrapper rather than reading
+    # it through python
+    try:
+        log_file = open(filepath, 'rb')                             # pylint: disable=consider-using-with
+    except FileNotFoundError as exc:
+        raise Http404('Log file not found') from exc
+    return FileResponse(log_file, as_attachment=True, filename='qcrbox.log')
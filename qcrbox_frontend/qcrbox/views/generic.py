@@ -11,6 +11,8 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
 
+from qcrbox.utility import has_global_access
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -65,7 +67,7 @@ def update(
     obj_type = meta['obj_type']
 
     # If user is flagged as able to access unaffiliated data, always continue
-    if request.user.has_perm('qcrbox.global_access'):
+    if has_global_access(request):
         pass
 
     # Allow for an access-point check if a user is affiliated with the company to which the data
@@ -146,7 +148,7 @@ def delete(request, model, obj_id, meta, user_is_affiliated=False):
     obj_type = meta['obj_type']
 
     # If user is flagged as able to access unaffiliated data, always continue
-    if request.user.has_perm('qcrbox.global_access'):
+    if has_global_access(request):
         pass
 
     # Allow for an access-point check if a user is affiliated with the company to which the data
@@ -11,16 +11,28 @@ import logging
 
 from django.shortcuts import render
 from django.contrib import messages
-from django.contrib.auth.models import Group
+from django.contrib.auth.models import Group, User
 from django.contrib.auth.decorators import permission_required, login_required
-from django.core.exceptions import PermissionDenied
+from django.db.models import Count, Prefetch
 
 from qcrbox import forms
-from qcrbox.utility import DisplayField, paginate_objects
+from qcrbox.utility import (
+    DisplayField,
+    filter_group_owners,
+    has_global_access,
+    paginate_objects,
+)
 from qcrbox.views import generic
 
 LOGGER = logging.getLogger(__name__)
 
+# Columns shown in the view groups list
+GROUP_FIELDS = (
+    DisplayField('Name', 'name', is_header=True),
+    DisplayField('Owner(s)', 'owners', is_special=True),
+    DisplayField('# Members', 'membership', is_special=True),
+)
+
 
 # Can only edit groups if user has the global access perm
 @permission_required('qcrbox.global_access')
@@ -76,18 +88,20 @@ def view_groups(request):
 
     '''
 
-    fields = [
-        DisplayField('Name', 'name', is_header=True),
-        DisplayField('Owner(s)', 'owners', is_special=True),
-        DisplayField('# Members', 'membership', is_special=True),
-        ]
-
     # If a user can view unaffiliated data, they can view it all
-    if request.user.has_perm('qcrbox.global_access'):
+    if has_global_access(request):
         object_list = Group.objects.all()
     else:
-        object_list = request.user.groups.all()
-
+        # Filter on pk rather than using request.user.groups directly, so
+        # the member count below isn't restricted to the request user
+        object_list = Group.objects.filter(pk__in=request.user.groups.all())
+
+    # Count members in the same query and prefetch owners, to save queries per rendered row
+    object_list = object_list.annotate(user_count=Count('user')).prefetch_related(Prefetch(
+        'user_set',
+        queryset=filter_group_owners(User.objects.all()),
+        to_attr='owners_cached',
+    ))
     object_list = object_list.order_by('name')
     page = request.GET.get('page')
 
@@ -96,14 +110,18 @@ def view_groups(request):
     return render(request, 'view_list_generic.html', {
         'objects':objects,
         'type':'Group',
-        'fields':fields,
-        'edit_perms':request.user.has_perm('qcrbox.global_access'),
+        'fields':GROUP_FIELDS,
+        'edit_perms':has_global_access(request),
         'edit_link':'edit_group',
         'delete_link':'delete_group',
         'create_link':'create_group',
     })
 
-@permission_required('qcrbox.global_access', raise_exception=True)
+# User should have both global access AND edit permissions to be able to do this
+@permission_required(
+    ('qcrbox.global_access', 'qcrbox.edit_users'),
+    raise_exception=True,
+)
 def update_group(request, group_id):
     '''A view to handle rendering the 'edit group' page and handle the
     updating of a group on the submittal of the embedded form.  Based on
@@ -121,10 +139,6 @@ def update_group(request, group_id):
 
     '''
 
-    # User should have both global access AND edit permissions to be able to do this
-    if not request.user.has_perm('qcrbox.edit_users'):
-        raise PermissionDenied
-
     return generic.update(
         request=request,
         model=Group,
@@ -137,7 +151,11 @@ def update_group(request, group_id):
         user_is_affiliated=True
     )
 
-@permission_required('qcrbox.global_access', raise_exception=True)
+# User should have both global access AND edit permissions to be able to do this
+@permission_required(
+    ('qcrbox.global_access', 'qcrbox.edit_users'),
+    raise_exception=True,
+)
 def delete_group(request, group_id):
     '''A view to handle the deletion of groups.  Based on generic.delete().
 
@@ -153,10 +171,6 @@ def delete_group(request, group_id):
 
     '''
 
-    # User should have both global access AND edit permissions to be able to do this
-    if not request.user.has_perm('qcrbox.edit_users'):
-        raise PermissionDenied
-
     return generic.delete(
         request=request,
         model=Group,
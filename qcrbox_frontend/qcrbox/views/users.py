@@ -12,16 +12,34 @@ import logging
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
-from django.contrib.auth.models import User, Permission
+from django.contrib.auth.models import Group, User, Permission
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth.decorators import permission_required, login_required
+from django.db.models import Prefetch
 
 from qcrbox import forms
-from qcrbox.utility import DisplayField, paginate_objects
+from qcrbox.utility import DisplayField, has_global_access, paginate_objects
 from qcrbox.views import generic
 
 LOGGER = logging.getLogger(__name__)
 
+# Columns shown in the view users list
+USER_FIELDS = (
+    DisplayField('Username', 'username', is_header=True),
+    DisplayField('First Name', 'first_name'),
+    DisplayField('Last Name', 'last_name'),
+    DisplayField('Email', 'email'),
+    DisplayField('Group(s)', 'groups', is_special=True),
+    DisplayField('Role', 'role', is_special=True),
+)
+
+# Permission codenames granted by each role checkbox of the user creation form
+ROLE_PERM_FIELDS = (
+    ('edit_users', 'group_manager'),
+    ('edit_data', 'data_manager'),
+    ('global_access', 'global_access'),
+)
+
 
 def login_view(request):
     '''A view to handle rendering the login page and logging in users.
@@ -100,35 +118,31 @@ def create_user(request):
 
         form = forms.RegisterUserForm(request.POST, user=request.user)
         if form.is_valid():
-            form.save()
-            username = form.cleaned_data['username']
-
-            # Collect pk of desired user type from form checkboxes
-            user_groups = form.cleaned_data['user_groups']
-
-            # Fetch the user we just created
-            new_user = User.objects.get(username=username)
-
-            # Populate the user info
+            # Build the new user, populating the user info before the first
+            # save so the user is written with a single INSERT
+            new_user = form.save(commit=False)
             new_user.first_name = form.cleaned_data['first_name']
             new_user.last_name = form.cleaned_data['last_name']
             new_user.email = form.cleaned_data['email']
             new_user.save()
 
-            # Add user to the selected user group
-            for user_group in user_groups.all():
-
-                user_group.user_set.add(new_user)
-
-            # Add non-group related permissions
-            if form.cleaned_data['group_manager']:
-                new_user.user_permissions.add(Permission.objects.get(codename='edit_users'))
-
-            if form.cleaned_data['data_manager']:
-                new_user.user_permissions.add(Permission.objects.get(codename='edit_data'))
+            # Collect pk of desired user type from form checkboxes
+            user_groups = form.cleaned_data['user_groups']
 
-            if form.cleaned_data['global_access']:
-                new_user.user_permissions.add(Permission.objects.get(codename='global_access'))
+            # Add user to the selected user groups in a single insert
+            new_user.groups.add(*user_groups)
+
+            # Add non-group related permissions, fetching and adding all those
+            # selected at once
+            codenames = [
+                codename for codename, field in ROLE_PERM_FIELDS
+                if form.cleaned_data[field]
+            ]
+            if codenames:
+                new_user.user_permissions.add(*Permission.objects.filter(
+                    content_type__app_label='qcrbox',
+                    codename__in=codenames,
+                ))
 
             LOGGER.info(
                 'User %s created new user "%s"',
@@ -161,21 +175,26 @@ def view_users(request):
 
     '''
 
-    fields = [
-        DisplayField('Username', 'username', is_header=True),
-        DisplayField('First Name', 'first_name'),
-        DisplayField('Last Name', 'last_name'),
-        DisplayField('Email', 'email'),
-        DisplayField('Group(s)', 'groups', is_special=True),
-        DisplayField('Role', 'role', is_special=True),
-        ]
-
     # If a user can view unaffiliated data, they can view it all
-    if request.user.has_perm('qcrbox.global_access'):
+    if has_global_access(request):
         object_list = User.objects.all()
     else:
-        object_list = User.objects.filter(groups__in=request.user.groups.all())
-
+        # Users sharing several groups with the request user would otherwise
+        # be listed once per shared group
+        object_list = User.objects.filter(groups__in=request.user.groups.all()).distinct()
+
+    # Prefetch groups and qcrbox permissions to save queries per rendered row
+    qcrbox_perms = Permission.objects.filter(content_type__app_label='qcrbox')
+    object_list = object_list.prefetch_related(
+        'groups',
+        Prefetch('user_permissions', queryset=qcrbox_perms, to_attr='qcrbox_perms'),
+        Prefetch('groups__permissions', queryset=qcrbox_perms, to_attr='qcrbox_perms'),
+    )
+    # Only load the columns rendered in the list, and those read when
+    # resolving roles
+    object_list = object_list.only(
+        'username', 'first_name', 'last_name', 'email', 'is_active', 'is_superuser',
+    )
     object_list = object_list.order_by('username')
     page = request.GET.get('page')
 
@@ -184,7 +203,7 @@ def view_users(request):
     return render(request, 'view_list_generic.html', {
         'objects': objects,
         'type':'User',
-        'fields':fields,
+        'fields':USER_FIELDS,
         'edit_perms':request.user.has_perm('qcrbox.edit_users'),
         'edit_link':'edit_user',
         'delete_link':'delete_user',
@@ -209,10 +228,11 @@ def update_user(request, user_id):
 
     '''
 
-    edit_user_groups = User.objects.get(pk=user_id).groups.all()
-    current_user_groups = request.user.groups.all()
-
-    shared_groups = edit_user_groups & current_user_groups
+    # Check for a group containing both users in a single query; the two
+    # filters use separate joins so each user is matched independently.
+    # Users with global access skip the check, as generic ignores it for them
+    shared_groups = Group.objects.filter(user=request.user).filter(user=user_id)
+    user_is_affiliated = has_global_access(request) or shared_groups.exists()
 
     return generic.update(
         request=request,
@@ -223,7 +243,7 @@ def update_user(request, user_id):
             'model_form':forms.UpdateUserForm,
             'link_suffix':'users',
         },
-        user_is_affiliated=shared_groups.exists(),
+        user_is_affiliated=user_is_affiliated,
     )
 
 @login_required(login_url='login')
@@ -321,10 +341,11 @@ def delete_user(request, user_id):
         messages.warning(request, 'Cannot delete current account from this view.')
         return redirect('view_users')
 
-    deletion_user_groups = User.objects.get(pk=user_id).groups.all()
-    current_user_groups = request.user.groups.all()
-
-    shared_groups = deletion_user_groups & current_user_groups
+    # Check for a group containing both users in a single query; the two
+    # filters use separate joins so each user is matched independently.
+    # Users with global access skip the check, as generic ignores it for them
+    shared_groups = Group.objects.filter(user=request.user).filter(user=user_id)
+    user_is_affiliated = has_global_access(request) or shared_groups.exists()
 
     return generic.delete(
         request=request,
@@ -334,5 +355,5 @@ def delete_user(request, user_id):
             'obj_type':'User',
             'link_suffix':'users',
         },
-        user_is_affiliated=shared_groups.exists(),
+        user_is_affiliated=user_is_affiliated,
     )
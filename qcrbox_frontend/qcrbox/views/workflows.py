@@ -10,7 +10,7 @@ views.
 
 import logging
 
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.models import Group
@@ -20,10 +20,18 @@ from django.core.exceptions import PermissionDenied
 from qcrbox import api, forms, models, utility
 from qcrbox import workflow as wf
 from qcrbox.plotly_dash import plotly_app                           # pylint: disable=unused-import
-from qcrbox.utility import DisplayField, paginate_objects
+from qcrbox.utility import DisplayField, has_global_access, paginate_objects
 
 LOGGER = logging.getLogger(__name__)
 
+# Columns shown in the view sessions list
+SESSION_FIELDS = (
+    DisplayField('App', 'command__app', is_header=True),
+    DisplayField('Command', 'command'),
+    DisplayField('Invoked By', 'user'),
+    DisplayField('At Time', 'start_time'),
+)
+
 
 @login_required(login_url='login')
 def landing(_):
@@ -99,8 +107,9 @@ def initialise_workflow(request):
 
             file = request.FILES['file']
 
-            # Check the uploaded file is actually a cif.  If not, fail safely
-            if str(file)[-4:] != '.cif':
+            # Check the uploaded file is actually a cif, by its extension and
+            # then its contents.  If not, fail safely without calling the API
+            if not (file.name.lower().endswith('.cif') and utility.looks_like_cif(file)):
                 messages.warning(request, 'Uploaded files must be .cif!')
 
                 return render(
@@ -109,10 +118,15 @@ def initialise_workflow(request):
                     context,
                 )
 
+            # Fetch the group to assign to the dataset before uploading, so an
+            # invalid group does not leave an orphaned dataset in the backend;
+            # only its pk is needed to assign it
+            group = get_object_or_404(Group.objects.only('pk'), pk=request.POST['group'])
+
             LOGGER.info(
                 'User %s uploading file "%s"',
                 request.user.username,
-                str(file),
+                file.name,
             )
 
             # Attempt to upload dataset via the API
@@ -122,15 +136,12 @@ def initialise_workflow(request):
 
                 LOGGER.error(
                     'File "%s" failed to upload!',
-                    str(file),
+                    file.name,
                 )
 
                 messages.warning(request, 'File failed to upload!')
                 return redirect('initialise_workflow')
 
-            # Fetch the group to assign to the dataset
-            group = Group.objects.get(pk=request.POST['group'])
-
             # Save the file's FileMetaData
             newfile = wf.save_dataset_metadata(
                 request,
@@ -171,8 +182,10 @@ def workflow(request, file_id):
 
     '''
 
-    # Fetch the current file from the file_id passed in url
-    load_file = models.FileMetaData.objects.get(pk=file_id)   # pylint: disable=no-member
+    # Fetch the current file from the file_id passed in url, alongside its
+    # group, which is needed for the permission check below
+    file_objs = models.FileMetaData.objects                             # pylint: disable=no-member
+    load_file = file_objs.select_related('group').get(pk=file_id)
 
     # Check the user has permission to view this file
     utility.check_user_view_file_permission(request.user, load_file)
@@ -198,7 +211,8 @@ def workflow(request, file_id):
         # Check user actually picked a command
         if 'command' in request.POST:
             comm_id = request.POST['command']
-            current_command = models.AppCommand.objects.get(pk=comm_id) # pylint: disable=no-member
+            command_objs = models.AppCommand.objects                    # pylint: disable=no-member
+            current_command = command_objs.select_related('app').get(pk=comm_id)
             context['current_command'] = current_command
             context['command_form'] = forms.CommandForm(
                 command=current_command,
@@ -252,8 +266,12 @@ def workflow_pending(request, file_id, command_id):
 
     '''
 
-    load_file = models.FileMetaData.objects.get(pk=file_id)   # pylint: disable=no-member
-    command = models.AppCommand.objects.get(pk=command_id)    # pylint: disable=no-member
+    # Fetch the current file alongside its group, which is needed for the
+    # permission check below
+    file_objs = models.FileMetaData.objects                             # pylint: disable=no-member
+    load_file = file_objs.select_related('group').get(pk=file_id)
+    command_objs = models.AppCommand.objects                            # pylint: disable=no-member
+    command = command_objs.select_related('app').get(pk=command_id)
 
     if 'end_calculation' in request.POST:
         wf.cancel_calculation(request)
@@ -294,23 +312,18 @@ def view_sessions(request):
 
     '''
 
-    fields = [
-        DisplayField('App', 'command__app', is_header=True),
-        DisplayField('Command', 'command'),
-        DisplayField('Invoked By', 'user'),
-        DisplayField('At Time', 'start_time'),
-        ]
-
     object_list = models.SessionReference.objects.all()                 # pylint: disable=no-member
 
     # If a user can view unaffiliated data, they can view it all
-    if request.user.has_perm('qcrbox.global_access'):
+    if has_global_access(request):
         pass
     elif request.user.has_perm('qcrbox.edit_users'):
         object_list = object_list.filter(user__groups__in=request.user.groups.all())
     else:
         object_list = object_list.filter(user=request.user)
 
+    # Fetch the app, command and user shown in each row in the same query
+    object_list = object_list.select_related('command__app', 'user')
     object_list = object_list.order_by('start_time')
     page = request.GET.get('page')
 
@@ -319,7 +332,7 @@ def view_sessions(request):
     return render(request, 'view_list_generic.html', {
         'objects': objects,
         'type':'Session',
-        'fields':fields,
+        'fields':SESSION_FIELDS,
         'kill_link':'kill_session',
     })
 
@@ -345,10 +358,11 @@ def kill_session(request, sessionref_id):
     session_ref = models.SessionReference.objects.get(pk=sessionref_id) # pylint: disable=no-member
 
     # Run some last minute permission checks to ensure the user should be allowed to do this
-    if request.user.has_perm('qcrbox.global_access'):
+    if has_global_access(request):
         pass
     elif request.user.has_perm('edit_users'):
-        if not (session_ref.user.groups.all() & request.user.groups.all()).exists():
+        shared_groups = Group.objects.filter(user=request.user).filter(user=session_ref.user_id)
+        if not shared_groups.exists():
             raise PermissionDenied
     else:
         if session_ref.user != request.user:
@@ -6,8 +6,10 @@ Frontend's functionality.  Refactored here for readability.
 
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from django.contrib import messages
+from django.db import connection
 
 from qcrbox import api
 from qcrbox import forms
@@ -16,6 +18,9 @@ from qcrbox import utility
 
 LOGGER = logging.getLogger(__name__)
 
+# The maximum number of API calls to be made concurrently
+MAX_API_WORKERS = 8
+
 class WorkStatus():
     '''A simple object to compactly return all salient information on
     the status of the current session/command to the workflow
@@ -34,7 +39,7 @@ class WorkStatus():
         self.outfile_id = outfile_id
 
 
-def save_dataset_metadata(request, api_response, group, infile=None, command=None, params='{}'):
+def save_dataset_metadata(request, api_response, group, infile=None, command=None, params=None):
     '''Given a succesful upload of data to the backend, take the API response
     returned from that upload and create a Frontend FileMetaData object to
     refer to the uploaded dataset.  If the new file is the output of an
@@ -55,6 +60,8 @@ def save_dataset_metadata(request, api_response, group, infile=None, command=Non
     - command(AppCommand, optional): the AppCommand data corresponding
             to the application command used in the session which generated
             this dataset, if applicable.
+    - params(dict, optional): the parameters the command was invoked with,
+            if applicable.
 
     Returns:
     - newfile(FileMetaData): the newly created FileMetaData object.
@@ -66,13 +73,15 @@ def save_dataset_metadata(request, api_response, group, infile=None, command=Non
 
     # Append disambiguation number to the end of a display filename if needed
     curr_files = models.FileMetaData.objects.filter(active=True)        # pylint: disable=no-member
-    curr_filenames = curr_files.values_list('display_filename', flat=True)
 
-    if outfile_meta.filename in curr_filenames:
-        i = 2
-        [new_filename_lead, new_filename_ext] = outfile_meta.filename.split('.')
-        while f'{new_filename_lead}({i}).{new_filename_ext}' in curr_filenames:
-            i += 1
+    if curr_files.filter(display_filename=outfile_meta.filename).exists():
+        new_filename_lead, new_filename_ext = outfile_meta.filename.rsplit('.', 1)
+
+        # Take the lowest index from 2 upwards not already in use
+        i = utility.get_next_free_index(
+            curr_files, 'display_filename', new_filename_lead, f'.{new_filename_ext}', start=2,
+        )
+
         display_filename = f'{new_filename_lead}({i}).{new_filename_ext}'
 
     else:
@@ -102,7 +111,7 @@ def save_dataset_metadata(request, api_response, group, infile=None, command=Non
             command=command,
             infile=infile,
             outfile=newfile,
-            parameters=params,
+            parameters=params or {},
         )
         newprocessstep.save()
 
@@ -154,8 +163,9 @@ def clear_session_references(request, session_id):
 
     '''
 
-    # remove browser cookie
-    request.session['session_id'] = None
+    # remove browser cookie; dropping the key entirely (rather than storing
+    # None) lets the 'session_id in request.session' guards catch it
+    request.session.pop('session_id', None)
 
     session = models.SessionReference.objects.get(session_id=session_id)# pylint: disable=no-member
     session.delete()
@@ -350,10 +360,20 @@ def kill_sessions(request, sessions):
     '''
 
     at_least_one_closed = False
+    sessions = list(sessions)
+
+    if not sessions:
+        return at_least_one_closed
 
-    for session in sessions:
+    # Closures are independent of each other, so send them concurrently
+    # rather than waiting on each backend roundtrip in turn
+    with ThreadPoolExecutor(max_workers=min(len(sessions), MAX_API_WORKERS)) as executor:
+        closure_api_responses = list(executor.map(
+            lambda session: api.close_session(session.session_id),
+            sessions,
+        ))
 
-        closure_api_response = api.close_session(session.session_id)
+    for session, closure_api_response in zip(sessions, closure_api_responses):
 
         if closure_api_response.is_valid:
             at_least_one_closed = True
@@ -454,7 +474,9 @@ def update_apps(request):
     if not update_response:
         messages.warning(request, 'Warning: could not update applications list!')
         LOGGER.warning('Could not sync local frontend applications list!')
-    else:
+    elif any(update_response.values()):
+        # Only log syncs which changed something, as most calls are skipped
+        # while a recent sync is still cached
         new_apps = ', '.join(str(pk) for pk in update_response['new_apps'])
         deprecated_apps = ', '.join(str(pk) for pk in update_response['deactivated_apps'])
         reactivated_apps = ', '.join(str(pk) for pk in update_response['reactivated_apps'])
@@ -489,20 +511,44 @@ def get_file_history(infile):
 
     '''
 
-    prior_steps = []
-    current_file = infile
+    step_objs = models.ProcessStep.objects                              # pylint: disable=no-member
+    table = models.ProcessStep._meta.db_table                           # pylint: disable=no-member,protected-access
+
+    # Fetch the pks of every step upstream of the infile in a single query.
+    # This is raw SQL because the ORM cannot express a recursive query; the
+    # ancestry is a chain, so walking it with filters would cost one query
+    # per ancestor.  Only the table name is interpolated, and it comes from
+    # the model's own metadata; the file pk is passed as a query parameter
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''WITH RECURSIVE ancestry(id, infile_id) AS (
+                SELECT id, infile_id FROM {table} WHERE outfile_id = %s
+                UNION
+                SELECT s.id, s.infile_id FROM {table} s
+                    JOIN ancestry a ON s.outfile_id = a.infile_id
+            ) SELECT id FROM ancestry''',
+            [infile.pk],
+        )
+        ancestor_pks = [row[0] for row in cursor.fetchall()]
 
-    # While working on a step with a creation history...
-    while current_file.processed_by.all():
-        prior_step = current_file.processed_by.first()
-        prior_steps = [prior_step] + prior_steps
+    # Key the steps by the file they created, keeping the earliest step for
+    # each file as processed_by.first() would
+    steps = step_objs.filter(pk__in=ancestor_pks).select_related('infile', 'command__app')
+    steps_by_outfile = {}
+    for step in steps.order_by('-pk'):
+        steps_by_outfile[step.outfile_id] = step
+
+    prior_steps = []
+    current_pk = infile.pk
 
-        # Move one step back if possible
-        current_file = prior_step.infile
+    # While working on a step with a creation history, move one step back;
+    # stop if the history is malformed and loops back on itself
+    while current_pk in steps_by_outfile:
+        prior_step = steps_by_outfile.pop(current_pk)
+        prior_steps.append(prior_step)
+        current_pk = prior_step.infile_id
 
-        # Failsafe for if the prior step is malformed
-        if not hasattr(current_file, 'processed_by'):
-            break
+    prior_steps.reverse()
 
     return prior_steps
 